@@ -1,8 +1,22 @@
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 from io import BytesIO
 from os import path, getenv
+from urllib.parse import parse_qsl
+import atexit
+import errno
+import hashlib
+import json
 import logging
 import re
-from flask import Flask, Response, request
+import socket
+import threading
+from flask import Flask, Response, request, send_file
+from flask_caching import Cache
+from werkzeug.datastructures import MultiDict
+from werkzeug.exceptions import BadRequest
+from werkzeug.formparser import FormDataParser
+from werkzeug.http import parse_options_header
 from PIL import ImageFont
 from dotenv import load_dotenv
 from brother_ql.labels import ALL_LABELS, Color
@@ -12,11 +26,20 @@ from app.imaging import create_barcode, create_label_image
 
 load_dotenv()
 
+app = Flask(__name__)
+cache = Cache(app, config={'CACHE_TYPE': 'SimpleCache', 'CACHE_DEFAULT_TIMEOUT': 60})
+
+# Printer address in PRINTER_PATH and the loaded media on the PT status page
+_TCP_IP_RE = re.compile(r'tcp://([0-9.]+)')
+_MEDIA_RE = re.compile(r'<dt>Media.*?Type</dt>\s*<dd>(\d+)mm', re.IGNORECASE | re.DOTALL)
+
+# Cache failed lookups too so an unreachable printer isn't polled on every request
+@cache.memoize(timeout=60, cache_none=True)
 def _get_pt_label_size(printer_path):
     """Auto-detect PT printer label size from web interface."""
     try:
         # Extract IP from printer path (tcp://10.2.3.135 -> 10.2.3.135)
-        ip_match = re.search(r'tcp://([0-9.]+)', printer_path)
+        ip_match = _TCP_IP_RE.search(printer_path)
         if not ip_match:
             return None
             
@@ -24,7 +47,6 @@ def _get_pt_label_size(printer_path):
         
         from urllib.request import urlopen
         from urllib.error import URLError
-        import socket
         
         url = f"http://{printer_ip}/general/status.html"
         
@@ -33,7 +55,7 @@ def _get_pt_label_size(printer_path):
             html_content = response.read().decode('utf-8')
         
         # Extract media type from HTML
-        media_match = re.search(r'<dt>Media.*?Type</dt>\s*<dd>(\d+)mm', html_content, re.IGNORECASE | re.DOTALL)
+        media_match = _MEDIA_RE.search(html_content)
         
         if media_match:
             width_mm = int(media_match.group(1))
@@ -67,6 +89,24 @@ logging.basicConfig(
 selected_backend = guess_backend(Config.PRINTER_PATH)
 BACKEND_CLASS = backend_factory(selected_backend)['backend_class']
 
+# Printer writes run in the background, a single worker keeps them serialized
+# since the brother_ql backends aren't thread-safe
+PRINT_EXECUTOR = ThreadPoolExecutor(max_workers=1, thread_name_prefix="printer")
+
+# Open printer backends, reused across prints to skip reopening the device per label.
+# Network printers send unsolicited status replies and drop idle connections, so a
+# kept socket can't be told apart from a dead one, those connect for each job instead
+_BACKENDS = {}
+_REUSE_BACKEND = selected_backend != 'network'
+# A kept device handle fails with these once the printer is replugged or power
+# cycled, the write is rejected before any of it reaches the printer
+_STALE_HANDLE_ERRNOS = (errno.ENODEV, errno.EBADF, errno.EPIPE)
+_BACKEND_LOCK = threading.Lock()
+
+# Label specs indexed by identifier
+_LABEL_BY_ID = {x.identifier: x for x in ALL_LABELS}
+
+@cache.memoize(timeout=60)
 def _get_current_label_size_and_spec():
     """Get current label size and spec, detecting PT printer size if needed."""
     # For PT printers with TCP connection, auto-detect label size
@@ -85,7 +125,9 @@ def _get_current_label_size_and_spec():
         label_size = Config.LABEL_SIZE
     
     # Get label spec from size
-    label_spec = next(x for x in ALL_LABELS if x.identifier == label_size)
+    label_spec = _LABEL_BY_ID.get(label_size)
+    if label_spec is None:
+        raise ValueError(f"Unknown label size: {label_size}")
     return label_size, label_spec
 
 # Load fonts
@@ -93,14 +135,17 @@ thisDir = path.dirname(path.abspath(__file__))
 nameFont = ImageFont.truetype(path.join(thisDir, "..", "fonts", Config.NAME_FONT), Config.NAME_FONT_SIZE)
 ddFont = ImageFont.truetype(path.join(thisDir, "..", "fonts", Config.DUE_DATE_FONT), Config.DUE_DATE_FONT_SIZE)
 
-app = Flask(__name__)
+# Fonts and line limit are fixed for the deployment, only the label size can change
+_make_label_image = partial(
+    create_label_image, text_font=nameFont, text_max_lines=Config.NAME_MAX_LINES, due_date_font=ddFont
+)
 
 @app.before_request
 def log_post_json_requests():
     if request.method == "POST" and request.is_json:
-        json_data = request.get_json()
+        # Log the body as sent, get_params parses it once per distinct payload
         endpoint = request.endpoint or request.path
-        logging.info(f"POST JSON Request to {endpoint} - Data: {json_data}")
+        logging.info("POST JSON Request to %s - Data: %s", endpoint, request.get_data(as_text=True))
 
 @app.route("/")
 def home_route():
@@ -112,16 +157,30 @@ def home_route():
 
 def get_params():
     """Extract and validate parameters from request."""
-    # Handle different data sources
-    if request.method == "POST" and request.is_json:
-        source = request.get_json()
-        logging.debug(f"POST JSON request - Data: {source}")
-    elif request.method == "POST":
-        source = request.form
-        logging.debug(f"POST form request - Data: {dict(source)}")
+    # Grocy retries webhooks with identical payloads, reuse what was extracted for them
+    raw = request.get_data() if request.method == "POST" else request.query_string
+    return _parse_params(raw, request.method, request.content_type or "")
+
+@cache.memoize(timeout=10)
+def _parse_params(raw, method, content_type):
+    """Extract parameters from a raw request body or query string."""
+    mimetype, options = parse_options_header(content_type)
+    
+    # Handle different data sources, parsed the way Flask parses them
+    if method == "POST" and _is_json_mimetype(mimetype):
+        try:
+            source = json.loads(raw)
+        except ValueError as e:
+            raise BadRequest(f"Failed to decode JSON object: {e}")
+        logging.debug("POST JSON request - Data: %s", source)
+    elif method == "POST":
+        _, source, _ = FormDataParser().parse(BytesIO(raw), mimetype, len(raw), options)
+        if logging.getLogger().isEnabledFor(logging.DEBUG):
+            logging.debug("POST form request - Data: %s", dict(source))
     else:
-        source = request.args
-        logging.debug(f"GET request - Query params: {dict(source)}")
+        source = MultiDict(parse_qsl(raw.decode(errors="replace"), keep_blank_values=True))
+        if logging.getLogger().isEnabledFor(logging.DEBUG):
+            logging.debug("GET request - Query params: %s", dict(source))
 
     # Extract name from various fields
     name_fields = ['product', 'battery', 'chore', 'recipe']
@@ -161,9 +220,13 @@ def get_params():
     
     unit_name = _get_unit_name(quantity_unit_stock, label_fields['amount'])
     
-    logging.debug(f"Extracted - name: '{name}', barcode: '{barcode}', label_fields: {label_fields}, unit: '{unit_name}'")
+    logging.debug("Extracted - name: '%s', barcode: '%s', label_fields: %s, unit: '%s'", name, barcode, label_fields, unit_name)
     return (name, barcode, label_fields['best_before_date'], label_fields['purchased_date'], label_fields['amount'], unit_name)
 
+def _is_json_mimetype(mimetype):
+    """Check for application/json or application/*+json, like request.is_json."""
+    return mimetype == "application/json" or (mimetype.startswith("application/") and mimetype.endswith("+json"))
+
 def _get_unit_name(quantity_unit_stock, amount):
     """Get appropriate unit name (singular/plural)."""
     if not quantity_unit_stock.get('name'):
@@ -180,39 +243,67 @@ def _get_unit_name(quantity_unit_stock, amount):
 @app.route("/print", methods=["GET", "POST"])
 def print_route():
     """Generate and print a label."""
-    logging.debug(f"Print endpoint: {request.method} {request.url}")
+    logging.debug("Print endpoint: %s %s", request.method, request.url)
     params = get_params()
-    label = _create_label(*params)
-    sendToPrinter(label)
-    logging.debug("Label sent to printer successfully")
-    return Response("OK", 200)
+    label_size, label_spec = _get_current_label_size_and_spec()
+    
+    # Reprints of the same label reuse the already rasterized printer data
+    cache_key = "print:" + hashlib.blake2b(
+        json.dumps([label_size, params], sort_keys=True).encode()
+    ).hexdigest()
+    data = cache.get(cache_key)
+    if data is None:
+        data = _rasterize_label(_create_label(label_spec, *params), label_size, label_spec)
+        cache.set(cache_key, data)
+    
+    future = PRINT_EXECUTOR.submit(_write_to_printer, data)
+    future.add_done_callback(_log_print_result)
+    logging.debug("Label queued for printing")
+    return Response("OK", 202)
 
 @app.route("/image")
 def image_route():
     """Generate and return label image."""
-    logging.debug(f"Image endpoint: {request.method} {request.url}")
+    logging.debug("Image endpoint: %s %s", request.method, request.url)
     params = get_params()
-    img = _create_label(*params)
-    
-    buf = BytesIO()
-    img.save(buf, format="PNG")
-    buf.seek(0)
+    label_size, _ = _get_current_label_size_and_spec()
+    png, etag = _render_label_png(label_size, *params)
     
     logging.debug("Label image generated successfully")
-    return Response(buf, 200, mimetype="image/png")
+    return send_file(
+        BytesIO(png), mimetype="image/png", download_name="label.png",
+        etag=etag, max_age=60
+    )
 
-def _create_label(name, barcode_text, best_before_date, purchased_date, amount, unit_name):
+# Keyed on the label size like the print cache, it also decides the image mode
+@cache.memoize(timeout=60)
+def _render_label_png(label_size, *params):
+    """Render label image as PNG bytes along with an ETag for them."""
+    img = _create_label(_LABEL_BY_ID[label_size], *params)
+    
+    # Previews are transient, favour encoding speed over file size
+    buf = BytesIO()
+    img.save(buf, format="PNG", compress_level=1, optimize=False)
+    png = buf.getvalue()
+    return png, hashlib.blake2b(png, digest_size=16).hexdigest()
+
+def _create_label(label_spec, name, barcode_text, best_before_date, purchased_date, amount, unit_name):
     """Create label image with given parameters."""
-    _, label_spec = _get_current_label_size_and_spec()
     barcode = create_barcode(barcode_text, Config.BARCODE_FORMAT)
-    return create_label_image(
-        label_spec.dots_total, name, nameFont, Config.NAME_MAX_LINES,
-        barcode, best_before_date, purchased_date, amount, unit_name, ddFont
+    # Only red labels need colour, everything else is drawn single channel
+    image_mode = "RGB" if label_spec.color == Color.BLACK_RED_WHITE else "L"
+    return _make_label_image(
+        label_spec.dots_total, text=name, barcode=barcode,
+        best_before_date=best_before_date, purchased_date=purchased_date,
+        amount=amount, unit_name=unit_name, image_mode=image_mode
     )
 
 def sendToPrinter(image):
     """Send image to Brother QL printer."""
-    label_size, label_spec = _get_current_label_size_and_spec()
+    _write_to_printer(_rasterize_label(image, *_get_current_label_size_and_spec()))
+
+def _rasterize_label(image, label_size, label_spec):
+    """Convert label image to Brother QL raster data."""
     bql = BrotherQLRaster(Config.PRINTER_MODEL)
     bql.dpi_600 = Config.PRINTER_600DPI
     
@@ -220,7 +311,65 @@ def sendToPrinter(image):
         bql, image, label_size,
         red=(label_spec.color == Color.BLACK_RED_WHITE)
     )
-    
-    backend = BACKEND_CLASS(Config.PRINTER_PATH)
-    backend.write(bql.data)
-    backend.dispose() if hasattr(backend, 'dispose') else None
+    return bql.data
+
+def _log_print_result(future):
+    """Log the outcome of a background printer write."""
+    error = future.exception()
+    if error:
+        logging.error("Failed to send label to printer", exc_info=error)
+    else:
+        logging.debug("Label sent to printer successfully")
+
+def _write_to_printer(data):
+    """Write raster data to the configured printer backend."""
+    with _BACKEND_LOCK:
+        try:
+            reused = Config.PRINTER_PATH in _BACKENDS
+            try:
+                _write_backend(Config.PRINTER_PATH, data)
+            except OSError as e:
+                if not (reused and e.errno in _STALE_HANDLE_ERRNOS):
+                    raise
+                logging.warning("Printer %s was disconnected since the last label, reopening it", Config.PRINTER_PATH)
+                _write_backend(Config.PRINTER_PATH, data)
+        finally:
+            if not _REUSE_BACKEND:
+                _dispose_backend(Config.PRINTER_PATH)
+
+def _write_backend(printer_path, data):
+    """Write to the printer's backend, closing it if the write fails."""
+    backend = _get_backend(printer_path)
+    try:
+        backend.write(data)
+    except OSError:
+        # Part of the label may already be printed, resending it could print a
+        # duplicate, so only reopen the backend for the next job
+        _dispose_backend(printer_path)
+        raise
+
+def _get_backend(printer_path):
+    """Get the open backend for a printer, opening it on first use."""
+    backend = _BACKENDS.get(printer_path)
+    if backend is None:
+        try:
+            backend = BACKEND_CLASS(printer_path)
+        except OSError:
+            # Nothing has been sent yet, so opening again can't duplicate a label
+            logging.warning("Could not open printer %s, retrying once", printer_path)
+            backend = BACKEND_CLASS(printer_path)
+        _BACKENDS[printer_path] = backend
+    return backend
+
+def _dispose_backend(printer_path):
+    """Close and forget the backend for a printer."""
+    backend = _BACKENDS.pop(printer_path, None)
+    if backend is not None and hasattr(backend, 'dispose'):
+        backend.dispose()
+
+@atexit.register
+def _dispose_backends():
+    """Close all open printer backends on shutdown."""
+    with _BACKEND_LOCK:
+        for printer_path in list(_BACKENDS):
+            _dispose_backend(printer_path)
@@ -1,21 +1,47 @@
 """Barcode generation utilities."""
 
-import treepoem
+from functools import lru_cache
+
 import qrcode
 from PIL import Image
+from ppf.datamatrix import DataMatrix
+
+# Pixels per module for Data Matrix codes, the size treepoem used to render them at
+DATAMATRIX_MODULE_SIZE = 4
+
+_NEAREST = Image.Resampling.NEAREST
 
 
 def create_datamatrix(text: str) -> Image.Image:
-    """Create a Data Matrix barcode, fallback to QR code if it fails."""
-    try:
-        barcode = treepoem.generate_barcode(barcode_type='datamatrix', data=text)
-        return barcode.convert('RGB')
-    except Exception:
-        return create_qr_code(text)
+    """Create a Data Matrix barcode, or a QR code for text ppf-datamatrix can't encode."""
+    return _datamatrix_image(text).copy()
 
 
 def create_qr_code(text: str) -> Image.Image:
     """Create a QR code with minimal border."""
+    return _qr_code_image(text).copy()
+
+
+def create_barcode(text: str, barcode_type: str) -> Image.Image:
+    """Create barcode based on type."""
+    if barcode_type.lower() == "qrcode":
+        return create_qr_code(text)
+    return create_datamatrix(text)  # Default to DataMatrix
+
+
+# The cached images are shared, the public functions hand out copies
+@lru_cache(maxsize=512)
+def _datamatrix_image(text: str) -> Image.Image:
+    """Generate a Data Matrix barcode once per text."""
+    try:
+        return _render_matrix(DataMatrix(text).matrix, DATAMATRIX_MODULE_SIZE)
+    except Exception:
+        return _qr_code_image(text)
+
+
+@lru_cache(maxsize=512)
+def _qr_code_image(text: str) -> Image.Image:
+    """Generate a QR code once per text."""
     qr = qrcode.QRCode(
         version=1,
         error_correction=qrcode.constants.ERROR_CORRECT_L,
@@ -24,16 +50,17 @@ def create_qr_code(text: str) -> Image.Image:
     )
     qr.add_data(text)
     qr.make(fit=True)
-    qr_image = qr.make_image(fill_color="black", back_color="white")
-    
-    # Convert to PIL Image if needed
-    if hasattr(qr_image, 'get_image'):
-        return qr_image.get_image()
-    return qr_image.convert('RGB')
+    # Render the module matrix directly, qrcode's image factory draws every module separately
+    return _render_matrix(qr.get_matrix(), 1)
 
 
-def create_barcode(text: str, barcode_type: str) -> Image.Image:
-    """Create barcode based on type."""
-    if barcode_type == "QRCode":
-        return create_qr_code(text)
-    return create_datamatrix(text)  # Default to DataMatrix
\ No newline at end of file
+def _render_matrix(matrix, module_size: int) -> Image.Image:
+    """Render a matrix of dark (1) and light (0) modules."""
+    size = (len(matrix[0]), len(matrix))
+    pixels = bytes(0 if module else 255 for row in matrix for module in row)
+    # Wrap the pixel bytes without copying, the returned image gets its own copy
+    image = Image.frombuffer('L', size, pixels, 'raw', 'L', 0, 1)
+    if module_size == 1:
+        return image.copy()
+    scaled_size = (size[0] * module_size, size[1] * module_size)
+    return image.resize(scaled_size, _NEAREST)
@@ -0,0 +1,44 @@
+"""Precomputed font metrics for fast text measurement."""
+
+from functools import lru_cache
+from itertools import product
+from typing import NamedTuple, Optional, Tuple
+from PIL import ImageFont
+
+# Printable ASCII, the range covered by the advance table
+FIRST_CHAR = 32
+LAST_CHAR = 126
+
+
+class FontMetrics(NamedTuple):
+    """Per-character advances for a font."""
+    advances: Tuple[float, ...]
+
+    def length(self, text: str) -> Optional[float]:
+        """Sum the advances of text, or None if it has characters outside the table."""
+        # Printable ASCII is exactly the FIRST_CHAR..LAST_CHAR range
+        if not (text.isascii() and text.isprintable()):
+            return None
+        advances = self.advances
+        return sum((advances[ord(char) - FIRST_CHAR] for char in text), 0.0)
+
+
+@lru_cache(maxsize=16)
+def get_metrics(font: ImageFont.FreeTypeFont) -> Optional[FontMetrics]:
+    """Build the metrics for a font, or None if summed advances wouldn't match getlength.
+
+    Raqm shapes whole strings, so fonts laid out with it (the default whenever
+    libraqm is installed) always get None and are measured by FreeType.
+    """
+    # Only basic layout measures text as the plain sum of its advances
+    if getattr(font, "layout_engine", None) != ImageFont.Layout.BASIC:
+        return None
+
+    advances = tuple(font.getlength(chr(char)) for char in range(FIRST_CHAR, LAST_CHAR + 1))
+
+    # Basic layout only kerns adjacent pairs, so matching every pair covers any text
+    for (first, first_advance), (second, second_advance) in product(enumerate(advances), repeat=2):
+        pair = chr(FIRST_CHAR + first) + chr(FIRST_CHAR + second)
+        if first_advance + second_advance != font.getlength(pair):
+            return None
+    return FontMetrics(advances)
@@ -1,11 +1,22 @@
 """Label generation and layout utilities."""
 
-from typing import Tuple, NamedTuple
-from PIL import Image, ImageFont, ImageDraw
-from .text import wrap_text
+import logging
+from dataclasses import dataclass
+from functools import cached_property, lru_cache
+from typing import Tuple
+from PIL import Image, ImageColor, ImageFont, ImageDraw
+from .text import text_bbox, text_length, wrap_text
 
+logger = logging.getLogger(__name__)
 
-class LabelConfig(NamedTuple):
+# Integer factors barcodes may be enlarged by on fixed size labels
+BARCODE_SCALES = (2, 4, 6, 8)
+
+_NEAREST = Image.Resampling.NEAREST
+
+
+@dataclass(frozen=True, slots=True)
+class LabelConfig:
     """Configuration for label generation."""
     label_size: Tuple[int, int]
     text: str
@@ -17,6 +28,7 @@ class LabelConfig(NamedTuple):
     amount: str = ""
     unit_name: str = ""
     due_date_font: ImageFont.FreeTypeFont = None
+    image_mode: str = "L"
 
 
 class LabelLayout:
@@ -28,6 +40,10 @@ class LabelLayout:
         self.height, self.width = config.label_size if self.is_endless else (config.label_size[1], config.label_size[0])
         self.line_spacing = 4
         self.due_date_font = config.due_date_font or config.text_font
+        self.background = _get_color("white", config.image_mode)
+        self.ink = _get_color("black", config.image_mode)
+        self.date_display = self._create_date_display()
+        self.amount_display = self._create_amount_display()
         
     def create_label(self) -> Image.Image:
         """Create the complete label image."""
@@ -39,14 +55,14 @@ class LabelLayout:
             self.width = self._calculate_endless_width(barcode)
         
         # Create base label
-        label = Image.new("RGB", (self.width, self.height), "white")
+        label = Image.new(self.config.image_mode, (self.width, self.height), self.background)
         self._place_barcode(label, barcode)
         
         # Add text and metadata
         draw = ImageDraw.Draw(label)
         self._draw_content(draw, barcode)
         
-        return label.rotate(-90, expand=True) if self.is_endless else label
+        return label.transpose(Image.Transpose.ROTATE_270) if self.is_endless else label
     
     def _process_barcode(self) -> Image.Image:
         """Scale barcode appropriately for label type."""
@@ -56,23 +72,25 @@ class LabelLayout:
     
     def _scale_barcode_endless(self) -> Image.Image:
         """Scale barcode to fit endless label height."""
-        scale_factor = self.height / self.config.barcode.size[1]
+        barcode_width, barcode_height = self.config.barcode.size
+        scale_factor = self.height / barcode_height
         new_size = (
-            int(self.config.barcode.size[0] * scale_factor),
-            int(self.config.barcode.size[1] * scale_factor)
+            int(barcode_width * scale_factor),
+            int(barcode_height * scale_factor)
         )
-        return self.config.barcode.resize(new_size, Image.Resampling.NEAREST)
+        return self.config.barcode.resize(new_size, _NEAREST)
     
     def _scale_barcode_fixed(self) -> Image.Image:
         """Scale barcode for fixed label dimensions."""
         barcode = self.config.barcode
+        barcode_width, barcode_height = barcode.size
         max_barcode_width = self.width // 2
         
-        if self.height > (self.height * 0.4) and barcode.size[0] <= max_barcode_width:
-            for scale in [8, 6, 4, 2]:
-                scaled_size = (barcode.size[0] * scale, barcode.size[1] * scale)
-                if (scaled_size[1] < self.height and scaled_size[0] <= max_barcode_width):
-                    return barcode.resize(scaled_size, Image.Resampling.NEAREST)
+        # Largest allowed scale that fits within half the width and the height
+        max_scale = min(max_barcode_width // barcode_width, (self.height - 1) // barcode_height)
+        scale = max((s for s in BARCODE_SCALES if s <= max_scale), default=1)
+        if scale > 1:
+            return _upscale_nn(barcode, scale)
         return barcode
     
     def _calculate_endless_width(self, barcode: Image.Image) -> int:
@@ -81,20 +99,24 @@ class LabelLayout:
             self.config.text, self.config.text_font, 1000, self.config.text_max_lines
         )
         
-        date_display = self._create_date_display()
-        amount_display = self._create_amount_display()
+        amount_display = self.amount_display
+        date_display = self.date_display
         
         text_width_needed = name_text_width
         if date_display:
-            text_width_needed = max(text_width_needed, self.due_date_font.getlength(date_display))
+            text_width_needed = max(text_width_needed, self._date_size[0])
         if amount_display:
-            text_width_needed = max(text_width_needed, self.due_date_font.getlength(amount_display))
+            text_width_needed = max(text_width_needed, self._amount_width)
         
+        barcode_width = barcode.size[0]
         gap = self.config.text_font.size // 2
-        calculated_width = int(barcode.size[0] + gap + text_width_needed)
-        min_width = barcode.size[0] + int(self.height * 0.4)
+        calculated_width = int(barcode_width + gap + text_width_needed)
+        min_width = barcode_width + int(self.height * 0.4)
         
-        return max(calculated_width, min_width)
+        width = max(calculated_width, min_width)
+        logger.debug("Calculated endless width: %d (barcode: %s, text: %d, date: %r, amount: %r)",
+                     width, barcode.size, text_width_needed, date_display, amount_display)
+        return width
     
     def _place_barcode(self, label: Image.Image, barcode: Image.Image) -> None:
         """Place barcode on the label."""
@@ -108,30 +130,33 @@ class LabelLayout:
     
     def _draw_main_text(self, draw: ImageDraw.ImageDraw, barcode: Image.Image) -> None:
         """Draw the main product text."""
+        barcode_width = barcode.size[0]
         if self.is_endless:
             name_text = self.config.text
-            text_x = barcode.size[0] + self.config.text_font.size // 2
+            text_x = barcode_width + self.config.text_font.size // 2
             text_align = "left"
             text_y = self._calculate_text_y_endless(name_text)
         else:
-            name_text, _ = wrap_text(
+            name_text, name_text_width = wrap_text(
                 self.config.text, self.config.text_font,
-                self.width - barcode.size[0], self.config.text_max_lines
+                self.width - barcode_width, self.config.text_max_lines
             )
-            text_width = self.config.text_font.getlength(name_text.split('\n')[0])
-            text_x = barcode.size[0] + (self.width - barcode.size[0] - text_width) // 2
+            # The wrapped width is the first line's width unless the name wrapped
+            first_line, _, other_lines = name_text.partition('\n')
+            text_width = text_length(self.config.text_font, first_line) if other_lines else name_text_width
+            text_x = barcode_width + (self.width - barcode_width - text_width) // 2
             text_align = "center"
             text_y = 0
         
         draw.multiline_text(
-            (text_x, text_y), name_text, fill="black",
+            (text_x, text_y), name_text, fill=self.ink,
             font=self.config.text_font, align=text_align, spacing=self.line_spacing
         )
     
     def _draw_metadata(self, draw: ImageDraw.ImageDraw, barcode: Image.Image) -> None:
         """Draw amount and date information."""
-        amount_display = self._create_amount_display()
-        date_display = self._create_date_display()
+        amount_display = self.amount_display
+        date_display = self.date_display
         
         if amount_display:
             self._draw_amount(draw, amount_display)
@@ -141,17 +166,15 @@ class LabelLayout:
     
     def _draw_amount(self, draw: ImageDraw.ImageDraw, amount_display: str) -> None:
         """Draw amount in top right corner."""
-        amount_width = self.due_date_font.getlength(amount_display)
-        amount_x = self.width - amount_width
-        draw.text((amount_x, 0), amount_display, fill="black", font=self.due_date_font)
+        amount_x = self.width - self._amount_width
+        draw.text((amount_x, 0), amount_display, fill=self.ink, font=self.due_date_font)
     
     def _draw_date(self, draw: ImageDraw.ImageDraw, date_display: str, barcode: Image.Image) -> None:
         """Draw date information."""
-        date_width = self.due_date_font.getlength(date_display)
-        _, _, _, date_height = self.due_date_font.getbbox(date_display)
+        date_width, date_height = self._date_size
         
         if self.is_endless:
-            text_width = self.config.text_font.getlength(self.config.text)
+            text_width = text_length(self.config.text_font, self.config.text)
             text_x = barcode.size[0] + self.config.text_font.size // 2
             date_x = text_x if date_width > text_width else text_x + text_width - date_width
             date_y = self.height - date_height
@@ -159,21 +182,32 @@ class LabelLayout:
             date_x = self.width - date_width
             date_y = self.height - date_height
         
-        draw.text((date_x, date_y), date_display, fill="black", font=self.due_date_font)
+        draw.text((date_x, date_y), date_display, fill=self.ink, font=self.due_date_font)
+    
+    @cached_property
+    def _amount_width(self) -> float:
+        """Width of the amount text, measured once per label."""
+        return text_length(self.due_date_font, self.amount_display)
+    
+    @cached_property
+    def _date_size(self) -> Tuple[float, int]:
+        """Width and bottom edge of the date text, measured once per label."""
+        _, _, _, date_bottom = text_bbox(self.due_date_font, self.date_display)
+        return text_length(self.due_date_font, self.date_display), date_bottom
     
     def _calculate_text_y_endless(self, text: str) -> int:
         """Calculate Y position for text in endless labels."""
-        amount_display = self._create_amount_display()
-        date_display = self._create_date_display()
+        amount_display = self.amount_display
+        date_display = self.date_display
         
         if amount_display and not date_display:
             amount_height = self.due_date_font.size
             available_height = self.height - amount_height
-            _, text_top, _, text_bottom = self.config.text_font.getbbox(text)
+            _, text_top, _, text_bottom = text_bbox(self.config.text_font, text)
             text_height = text_bottom - text_top
             return amount_height + (available_height - text_height) // 2 - text_top
         elif not date_display and not amount_display:
-            _, text_top, _, text_bottom = self.config.text_font.getbbox(text)
+            _, text_top, _, text_bottom = text_bbox(self.config.text_font, text)
             text_height = text_bottom - text_top
             return (self.height - text_height) // 2 - text_top
         else:
@@ -198,12 +232,31 @@ class LabelLayout:
         return amount or ""
 
 
+@lru_cache(maxsize=None)
+def _get_color(name: str, mode: str):
+    """Resolve a colour name for an image mode, parsing it only once."""
+    return ImageColor.getcolor(name, mode)
+
+
+def _upscale_nn(image: Image.Image, scale: int) -> Image.Image:
+    """Upscale a black and white image by an integer factor, nearest neighbour."""
+    # Barcodes carry no colour, replicate a single channel instead of three
+    if image.mode not in ("1", "L"):
+        image = image.convert("L")
+    return image.resize((image.size[0] * scale, image.size[1] * scale), _NEAREST)
+
+
 def create_label_image(label_size: Tuple[int, int], text: str,
                       text_font: ImageFont.FreeTypeFont, text_max_lines: int,
                       barcode: Image.Image, best_before_date: str = "",
                       purchased_date: str = "", amount: str = "",
-                      unit_name: str = "", due_date_font: ImageFont.FreeTypeFont = None) -> Image.Image:
-    """Create a label image with barcode, text, and optional date/amount info."""
+                      unit_name: str = "", due_date_font: ImageFont.FreeTypeFont = None,
+                      image_mode: str = "L") -> Image.Image:
+    """Create a label image with barcode, text, and optional date/amount info.
+    
+    Labels are drawn in greyscale by default, pass ``image_mode="RGB"`` for
+    labels that can print in colour.
+    """
     config = LabelConfig(
         label_size=label_size,
         text=text,
@@ -214,8 +267,9 @@ def create_label_image(label_size: Tuple[int, int], text: str,
         purchased_date=purchased_date,
         amount=amount,
         unit_name=unit_name,
-        due_date_font=due_date_font
+        due_date_font=due_date_font,
+        image_mode=image_mode
     )
     
     layout = LabelLayout(config)
-    return layout.create_label()
\ No newline at end of file
+    return layout.create_label()
@@ -1,78 +1,115 @@
 """Text processing utilities for labels."""
 
+from functools import lru_cache
 from typing import Tuple, List
 from PIL import ImageFont
+from .font_metrics import get_metrics
 
 
+# Fonts hash by identity; the caches keep them alive so keys stay unique
+@lru_cache(maxsize=4096)
+def text_length(font: ImageFont.FreeTypeFont, text: str) -> float:
+    """Measure the advance width of text, cached per font."""
+    metrics = get_metrics(font)
+    length = metrics.length(text) if metrics else None
+    return font.getlength(text) if length is None else length
+
+
+@lru_cache(maxsize=1024)
+def text_bbox(font: ImageFont.FreeTypeFont, text: str) -> Tuple[int, int, int, int]:
+    """Measure the bounding box of text, cached per font."""
+    return font.getbbox(text)
+
+
+@lru_cache(maxsize=1024)
 def wrap_text(text: str, font: ImageFont.FreeTypeFont, max_width: int, max_lines: int) -> Tuple[str, float]:
     """Wrap text to fit within specified width and line limits."""
-    min_width = font.getlength("A") * 3
-    if max_width < min_width:
-        return _truncate_text(text, font, max_width)
+    char_width = text_length(font, "A")
+    if max_width < char_width * 3:
+        return _truncate_text(text, font, max_width, char_width)
+    
+    # Most names fit on one line, skip the per-word layout for them
+    words = text.split()
+    single_line = ' '.join(words)
+    single_line_width = text_length(font, single_line)
+    if single_line_width < max_width and max_lines >= 1:
+        return single_line, single_line_width
     
-    words = _break_long_words(text.split(), font, max_width)
+    words = _break_long_words(words, font, max_width)
     lines = _create_lines(words, font, max_width)
     lines = _limit_lines(lines, max_lines, font)
     
-    longest_line = max(font.getlength(line) for line in lines) if lines else 0
-    return '\n'.join(lines), longest_line
+    longest_line = max(line_width for _, line_width in lines) if lines else 0
+    return '\n'.join(line for line, _ in lines), longest_line
 
 
-def _truncate_text(text: str, font: ImageFont.FreeTypeFont, max_width: int) -> Tuple[str, float]:
-    """Truncate text for very narrow labels."""
-    max_chars = max(1, int(max_width / font.getlength("A")))
+def _truncate_text(text: str, font: ImageFont.FreeTypeFont, max_width: int, char_width: float) -> Tuple[str, float]:
+    """Truncate text for very narrow labels, sized by the width of an "A"."""
+    max_chars = max(1, int(max_width / char_width))
     truncated = text[:max_chars] + ("..." if len(text) > max_chars else "")
-    return truncated, font.getlength(truncated)
+    return truncated, text_length(font, truncated)
 
 
-def _break_long_words(words: List[str], font: ImageFont.FreeTypeFont, max_width: int) -> List[str]:
-    """Break words that are too long to fit on a single line."""
+def _break_long_words(words: List[str], font: ImageFont.FreeTypeFont, max_width: int) -> List[Tuple[str, float]]:
+    """Break words that are too long to fit on a single line, returning (word, width) pairs."""
     result = []
-    min_char_width = font.getlength("A")
+    min_char_width = text_length(font, "A")
     
     for word in words:
-        if font.getlength(word) >= max_width:
+        word_width = text_length(font, word)
+        if word_width >= max_width:
             if max_width < min_char_width * 1.5:
-                result.append(word[0] if word else "")
+                part = word[0] if word else ""
+                result.append((part, text_length(font, part)))
             else:
                 mid = len(word) // 2
-                result.extend([word[:mid] + '-', word[mid:]])
+                for part in (word[:mid] + '-', word[mid:]):
+                    result.append((part, text_length(font, part)))
         else:
-            result.append(word)
+            result.append((word, word_width))
     return result
 
 
-def _create_lines(words: List[str], font: ImageFont.FreeTypeFont, max_width: int) -> List[str]:
-    """Create lines from words, fitting as many as possible per line."""
+def _create_lines(words: List[Tuple[str, float]], font: ImageFont.FreeTypeFont, max_width: int) -> List[Tuple[str, float]]:
+    """Create (line, width) pairs from measured words, fitting as many as possible per line."""
     lines = []
-    words_copy = words.copy()
+    line_words = []
+    line_width = 0.0
+    space_width = text_length(font, " ")
     
-    while words_copy:
-        line_words = []
-        while words_copy:
-            word = words_copy.pop(0)
-            test_line = ' '.join(line_words + [word])
-            if font.getlength(test_line) < max_width:
-                line_words.append(word)
-            else:
-                words_copy.insert(0, word)
-                break
-        
-        # Prevent infinite loop by forcing at least one character
-        if not line_words and words_copy:
-            line_words.append(words_copy.pop(0)[:1])
+    for word, word_width in words:
+        # Track the line width incrementally instead of re-measuring the joined line
+        test_width = line_width + space_width + word_width if line_words else word_width
+        if test_width < max_width:
+            line_words.append(word)
+            line_width = test_width
+            continue
         
         if line_words:
-            lines.append(' '.join(line_words))
+            lines.append((' '.join(line_words), line_width))
+            if word_width < max_width:
+                line_words = [word]
+                line_width = word_width
+                continue
+        
+        # A word too wide for a line of its own is cut down to its first character
+        lines.append((word[:1], text_length(font, word[:1])))
+        line_words = []
+        line_width = 0.0
+    
+    if line_words:
+        lines.append((' '.join(line_words), line_width))
     
     return lines
 
 
-def _limit_lines(lines: List[str], max_lines: int, font: ImageFont.FreeTypeFont) -> List[str]:
+def _limit_lines(lines: List[Tuple[str, float]], max_lines: int, font: ImageFont.FreeTypeFont) -> List[Tuple[str, float]]:
     """Limit number of lines, adding ellipsis if truncated."""
     if len(lines) <= max_lines:
         return lines
     
     limited_lines = lines[:max_lines]
-    limited_lines[-1] += '...'
+    # Only the line that gains the ellipsis needs measuring again
+    last_line = limited_lines[-1][0] + '...'
+    limited_lines[-1] = (last_line, text_length(font, last_line))
     return limited_lines
\ No newline at end of file
@@ -9,6 +9,7 @@ from PIL import ImageFont, Image
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
 
 from app.imaging import create_barcode, create_label_image, wrap_text
+from app.imaging.font_metrics import get_metrics
 
 def test_barcode_creation():
     """Test barcode creation functions."""
@@ -28,6 +29,20 @@ def test_barcode_creation():
     assert datamatrix.size[0] > 0 and datamatrix.size[1] > 0, "DataMatrix should have valid dimensions"
     print("✓ DataMatrix creation works")
 
+def test_barcode_cache():
+    """Test repeated barcodes are served from the cache as independent copies."""
+    print("Testing barcode cache...")
+    
+    first = create_barcode("cached_data", "QRCode")
+    second = create_barcode("cached_data", "qrcode")
+    assert first is not second, "Cached barcodes should be returned as copies"
+    assert first.tobytes() == second.tobytes(), "Barcode type should be matched case-insensitively"
+    
+    first.paste(Image.new(first.mode, first.size))
+    third = create_barcode("cached_data", "QRCode")
+    assert third.tobytes() == second.tobytes(), "Mutating a returned barcode should not affect the cache"
+    print("✓ Barcode cache works")
+
 def test_text_wrapping():
     """Test text wrapping function."""
     print("Testing text wrapping...")
@@ -51,6 +66,22 @@ def test_text_wrapping():
     assert isinstance(wrapped_text, str), "Wrapped text should be string even with narrow width"
     print("✓ Narrow width text wrapping works")
 
+def test_font_metrics():
+    """Test precomputed advances measure the same as the font."""
+    print("Testing font metrics...")
+    
+    font_path = os.path.join(os.path.dirname(__file__), '..', 'fonts', 'NotoSerif-Regular.ttf')
+    font = ImageFont.truetype(font_path, 48)
+    metrics = get_metrics(font)
+    if metrics is None:
+        print("✓ Font metrics unavailable for this layout engine, skipped")
+        return
+    
+    for text in ["", "Milk", "Organic Tomatoes 500g", "2024-12-31 - 2025-01-31"]:
+        assert metrics.length(text) == font.getlength(text), f"Metrics should match getlength for {text!r}"
+    assert metrics.length("Crème brûlée") is None, "Non-ASCII text should fall back to the font"
+    print("✓ Font metrics work")
+
 def test_label_creation():
     """Test label image creation."""
     print("Testing label creation...")
@@ -79,6 +110,8 @@ def test_label_creation():
     
     assert isinstance(label, Image.Image), "Label should return PIL Image"
     assert label.size[0] > 0 and label.size[1] > 0, "Label should have valid dimensions"
+    assert label.size[0] == 200, "Endless label should be rotated to the tape width"
+    assert label.getpixel((199, 0)) == 0, "Barcode should start at the top right after rotation"
     print("✓ Endless label creation works")
     
     # Test fixed label
@@ -94,6 +127,19 @@ def test_label_creation():
     assert isinstance(label, Image.Image), "Fixed label should return PIL Image"
     assert label.size == (400, 200), "Fixed label should maintain specified dimensions"
     print("✓ Fixed label creation works")
+    
+    # Test image modes
+    assert label.mode == "L", "Labels should default to greyscale"
+    label = create_label_image(
+        label_size=label_size,
+        text="Test Product",
+        text_font=font,
+        text_max_lines=2,
+        barcode=barcode,
+        image_mode="RGB"
+    )
+    assert label.mode == "RGB", "Labels should support RGB for red labels"
+    print("✓ Label image modes work")
 
 def main():
     """Run all tests."""
@@ -101,7 +147,9 @@ def main():
     
     try:
         test_barcode_creation()
+        test_barcode_cache()
         test_text_wrapping()
+        test_font_metrics()
         test_label_creation()
         print("\n✅ All tests passed! The refactored code works correctly.")
         return True
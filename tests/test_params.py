@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""Tests for extracting label parameters from Grocy requests."""
+
+import sys
+import os
+import json
+
+# Add app directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app import _parse_params
+
+
+def test_parse_params():
+    """Test parameters are parsed from the raw payload alone, outside a request."""
+    print("Testing parameter parsing...")
+
+    payload = {
+        'product': 'Milk', 'grocycode': 'grcy:p:1',
+        'stock_entry': {'amount': '2', 'best_before_date': '2024-12-31'},
+        'quantity_unit_stock': {'name': 'Pack', 'name_plural': 'Packs'}
+    }
+    params = _parse_params(json.dumps(payload).encode(), "POST", "application/json; charset=utf-8")
+    assert params == ('Milk', 'grcy:p:1', '2024-12-31', '', '2', 'Packs'), "JSON bodies should be parsed"
+
+    params = _parse_params(b"battery=Remote&grocycode=grcy%3Ab%3A2", "POST", "application/x-www-form-urlencoded")
+    assert params == ('Remote', 'grcy:b:2', '', '', '', ''), "Form bodies should be parsed"
+
+    params = _parse_params(b"chore=Water%20plants&grocycode=grcy%3Ac%3A3", "GET", "")
+    assert params == ('Water plants', 'grcy:c:3', '', '', '', ''), "Query strings should be parsed"
+    print("✓ Parameter parsing works")
+
+def main():
+    """Run all tests."""
+    print("Running parameter tests...\n")
+
+    try:
+        test_parse_params()
+        print("\n✅ All tests passed!")
+        return True
+    except Exception as e:
+        print(f"\n❌ Test failed: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""Tests for sending raster data to printer backends."""
+
+import sys
+import os
+import errno
+import socket
+import threading
+
+# Add app directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import app
+from brother_ql.backends import backend_factory
+
+
+class _PrinterSession:
+    """Temporarily point the app at another printer backend."""
+
+    def __init__(self, printer_path, backend_class, reuse_backend):
+        self.settings = (printer_path, backend_class, reuse_backend)
+
+    def __enter__(self):
+        self.saved = (app.Config.PRINTER_PATH, app.BACKEND_CLASS, app._REUSE_BACKEND)
+        app.Config.PRINTER_PATH, app.BACKEND_CLASS, app._REUSE_BACKEND = self.settings
+        return self
+
+    def __exit__(self, *exc_info):
+        app._dispose_backend(app.Config.PRINTER_PATH)
+        app.Config.PRINTER_PATH, app.BACKEND_CLASS, app._REUSE_BACKEND = self.saved
+
+
+class _FailingBackend:
+    """Backend whose writes fail after part of the data could have been sent."""
+    opened = 0
+    writes = 0
+
+    def __init__(self, device_specifier):
+        _FailingBackend.opened += 1
+
+    def write(self, data):
+        _FailingBackend.writes += 1
+        raise OSError("connection reset mid-write")
+
+    def dispose(self):
+        pass
+
+
+class _ReplugBackend:
+    """Backend whose first handle went stale when the printer was replugged."""
+    opened = 0
+    written = []
+
+    def __init__(self, device_specifier):
+        _ReplugBackend.opened += 1
+        self.stale = _ReplugBackend.opened == 1
+
+    def write(self, data):
+        if self.stale:
+            raise OSError(errno.ENODEV, "No such device")
+        _ReplugBackend.written.append(data)
+
+    def dispose(self):
+        pass
+
+
+def test_network_reconnect():
+    """Test each network job gets its own connection after the printer closes the last one."""
+    print("Testing network printer reconnect...")
+
+    server = socket.socket()
+    server.bind(("127.0.0.1", 0))
+    server.listen(2)
+    received = []
+
+    def serve():
+        for _ in range(2):
+            conn, _ = server.accept()
+            with conn:
+                # Printers answer with a status reply, then hang up once the job is in
+                conn.sendall(b"\x80" + b"\x00" * 31)
+                data = b""
+                while chunk := conn.recv(65536):
+                    data += chunk
+                received.append(data)
+
+    thread = threading.Thread(target=serve, daemon=True)
+    thread.start()
+
+    port = server.getsockname()[1]
+    network_backend = backend_factory('network')['backend_class']
+    with _PrinterSession(f"tcp://127.0.0.1:{port}", network_backend, False):
+        app._write_to_printer(b"first label")
+        app._write_to_printer(b"second label")
+        assert not app._BACKENDS, "Network backends should be closed after each job"
+
+    thread.join(timeout=5)
+    server.close()
+    assert received == [b"first label", b"second label"], "Every job should reach the printer"
+    print("✓ Network printer reconnect works")
+
+def test_failed_write_not_retried():
+    """Test a write that fails part way through is not sent again."""
+    print("Testing failed printer write...")
+
+    _FailingBackend.opened = _FailingBackend.writes = 0
+    with _PrinterSession("file:///dev/null", _FailingBackend, True):
+        try:
+            app._write_to_printer(b"label")
+            raise AssertionError("Failed write should raise")
+        except OSError:
+            pass
+        assert _FailingBackend.writes == 1, "A failed write should not be retried"
+        assert not app._BACKENDS, "A failed backend should be closed"
+
+        try:
+            app._write_to_printer(b"label")
+        except OSError:
+            pass
+        assert _FailingBackend.opened == 2, "The next job should reopen the backend"
+    print("✓ Failed printer write works")
+
+def test_stale_handle_reopened():
+    """Test a kept device handle is reopened when the printer was replugged."""
+    print("Testing replugged printer...")
+
+    _ReplugBackend.opened = 0
+    _ReplugBackend.written = []
+    with _PrinterSession("file:///dev/null", _ReplugBackend, True):
+        app._get_backend(app.Config.PRINTER_PATH)
+        app._write_to_printer(b"label")
+        assert _ReplugBackend.opened == 2, "A stale handle should be reopened"
+        assert _ReplugBackend.written == [b"label"], "The job should be printed once on the new handle"
+    print("✓ Replugged printer works")
+
+def main():
+    """Run all tests."""
+    print("Running printing tests...\n")
+
+    try:
+        test_network_reconnect()
+        test_failed_write_not_retried()
+        test_stale_handle_reopened()
+        print("\n✅ All tests passed!")
+        return True
+    except Exception as e:
+        print(f"\n❌ Test failed: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)